@@ -0,0 +1,323 @@
+jest.mock('node-fetch');
+
+const fetch = require('node-fetch');
+const { actionsCache, getBoardActions, MAX_CACHED_ACTIONS } = require('../server');
+
+function action(id, date) {
+  return { id: id, date: date, data: { card: { id: `card-${id}` }, list: { id: 'done' } } };
+}
+
+function isActionId(value) {
+  return /^[0-9a-f]{24}$/.test(value);
+}
+
+// Answer Trello actions queries from `board`, a newest-first action list,
+// honouring `since`/`before` as either action IDs or dates and paging by
+// `limit` like Trello does
+function serveActions(board) {
+  fetch.mockImplementation(async url => {
+    const params = new URL(url).searchParams;
+    const since = params.get('since');
+    const before = params.get('before');
+    const page = board.filter(a =>
+      (isActionId(since) ? a.id > since : a.date >= since) &&
+      (!before || (isActionId(before) ? a.id < before : a.date < before))
+    ).slice(0, Number(params.get('limit')));
+    return {
+      ok: true,
+      status: 200,
+      headers: { get: () => null },
+      json: async () => page
+    };
+  });
+}
+
+function sinceParam(call) {
+  return new URL(call[0]).searchParams.get('since');
+}
+
+describe('getBoardActions', () => {
+  const older = action('000000000000000000000001', '2026-01-05T10:00:00.000Z');
+  const newest = action('000000000000000000000002', '2026-01-06T10:00:00.000Z');
+  const added = action('000000000000000000000003', '2026-01-07T10:00:00.000Z');
+
+  beforeEach(() => {
+    actionsCache.clear();
+    fetch.mockReset();
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+  });
+
+  test('fetches only actions newer than the cache and merges them', async () => {
+    const board = [newest, older];
+    serveActions(board);
+
+    const first = await getBoardActions('board', '2026-01-01T00:00:00.000Z');
+    expect(first).toEqual([newest, older]);
+
+    board.unshift(added);
+    const second = await getBoardActions('board', '2026-01-06T00:00:00.000Z');
+
+    expect(sinceParam(fetch.mock.calls[1])).toBe(newest.id);
+    expect(second).toEqual([added, newest]);
+
+    expect(actionsCache.get('board').entries).toEqual([added, newest, older].map(a => ({
+      action: a,
+      time: Date.parse(a.date)
+    })));
+  });
+
+  test('merges new actions once when refreshes overlap', async () => {
+    const board = [newest, older];
+    serveActions(board);
+    await getBoardActions('board', '2026-01-01T00:00:00.000Z');
+
+    board.unshift(added);
+    await Promise.all([
+      getBoardActions('board', '2026-01-01T00:00:00.000Z'),
+      getBoardActions('board', '2026-01-01T00:00:00.000Z')
+    ]);
+
+    expect(actionsCache.get('board').entries.map(entry => entry.action))
+      .toEqual([added, newest, older]);
+  });
+
+  test('filters a range running into the future from the cache', async () => {
+    jest.spyOn(Date, 'now').mockReturnValue(Date.parse('2026-01-06T12:00:00.000Z'));
+    serveActions([added, newest, older]);
+
+    const actions = await getBoardActions(
+      'board', '2026-01-01T00:00:00.000Z', '2026-01-07T00:00:00.000Z'
+    );
+
+    expect(actions).toEqual([newest, older]);
+    expect(actionsCache.get('board').entries).toHaveLength(3);
+  });
+
+  test('fetches ranges that have already ended up to their end bound', async () => {
+    serveActions([newest, older]);
+
+    await getBoardActions('board', '2026-01-01T00:00:00.000Z', '2026-01-07T00:00:00.000Z');
+
+    expect(new URL(fetch.mock.calls[0][0]).searchParams.get('before'))
+      .toBe('2026-01-07T00:00:00.000Z');
+    expect(actionsCache.has('board')).toBe(false);
+  });
+
+  test('does not cache boards with more than MAX_CACHED_ACTIONS actions', async () => {
+    const board = [];
+    for (let i = MAX_CACHED_ACTIONS; i >= 0; i--) {
+      board.push(action(i.toString(16).padStart(24, '0'), new Date(Date.UTC(2026, 0, 1) + i * 1000).toISOString()));
+    }
+    serveActions(board);
+
+    const actions = await getBoardActions('board', '2026-01-01T00:00:00.000Z');
+
+    expect(actions).toHaveLength(MAX_CACHED_ACTIONS + 1);
+    expect(actionsCache.has('board')).toBe(false);
+  });
+
+  test('keeps recently used boards when evicting', async () => {
+    serveActions([newest]);
+    await getBoardActions('first', '2026-01-01T00:00:00.000Z');
+    await getBoardActions('second', '2026-01-01T00:00:00.000Z');
+    await getBoardActions('first', '2026-01-01T00:00:00.000Z');
+
+    expect([...actionsCache.keys()]).toEqual(['second', 'first']);
+  });
+});
+
+// Load a fresh copy of the server so limiter and breaker state start clean
+function loadServer() {
+  let server;
+  let trelloFetchMock;
+  jest.isolateModules(() => {
+    trelloFetchMock = require('node-fetch');
+    server = require('../server');
+  });
+  // The node-fetch mock may be shared with earlier loads, so clear its calls
+  trelloFetchMock.mockReset();
+  return { server, trelloFetchMock };
+}
+
+function reply(status, headers = {}) {
+  return {
+    ok: status < 400,
+    status: status,
+    headers: { get: name => (name in headers ? headers[name] : null) },
+    json: async () => []
+  };
+}
+
+describe('trelloRequest retries', () => {
+  let server;
+  let trelloFetchMock;
+  let callTimes;
+
+  beforeEach(() => {
+    jest.useFakeTimers({ now: Date.parse('2026-01-01T00:00:00.000Z') });
+    ({ server, trelloFetchMock } = loadServer());
+    callTimes = [];
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+    jest.restoreAllMocks();
+  });
+
+  function respondWith(...statuses) {
+    trelloFetchMock.mockImplementation(async () => {
+      callTimes.push(Date.now());
+      const next = statuses.length > 1 ? statuses.shift() : statuses[0];
+      return typeof next === 'number' ? reply(next) : next;
+    });
+  }
+
+  async function settle(promise) {
+    const outcome = promise.then(
+      value => ({ value: value }),
+      error => ({ error: error })
+    );
+    await jest.advanceTimersByTimeAsync(60000);
+    return outcome;
+  }
+
+  test('gives up on a 503 storm before the deadline, without a final wait', async () => {
+    jest.spyOn(Math, 'random').mockReturnValue(1);
+    respondWith(503);
+    const start = Date.now();
+
+    const outcome = await settle(server.trelloRequest('/boards/b/lists'));
+
+    expect(outcome.error.message).toBe('Trello API request failed');
+    expect(callTimes).toHaveLength(server.MAX_ATTEMPTS);
+    // Backoffs of 1s + 2s + 4s + 8s, and nothing after the last attempt
+    expect(callTimes[callTimes.length - 1] - start).toBe(15000);
+    expect(callTimes[callTimes.length - 1] - start).toBeLessThan(server.RETRY_DEADLINE_MS);
+  });
+
+  test('stops retrying when the next backoff would pass the deadline', async () => {
+    jest.spyOn(Math, 'random').mockReturnValue(1);
+    trelloFetchMock.mockImplementation(async () => {
+      callTimes.push(Date.now());
+      // Each attempt takes 4s before Trello answers
+      await new Promise(resolve => setTimeout(resolve, 4000));
+      return reply(503);
+    });
+    const start = Date.now();
+
+    const outcome = await settle(server.trelloRequest('/boards/b/lists'));
+
+    expect(outcome.error).toBeDefined();
+    // The fourth attempt ends at 23s, so its 8s backoff would pass 20s
+    expect(callTimes.map(time => time - start)).toEqual([0, 5000, 11000, 19000]);
+  });
+
+  test('waits out Retry-After on a 429 before retrying', async () => {
+    respondWith(reply(429, { 'retry-after': '3' }), 200);
+    const start = Date.now();
+
+    const outcome = await settle(server.trelloRequest('/boards/b/lists'));
+
+    expect(outcome.value.ok).toBe(true);
+    expect(callTimes.map(time => time - start)).toEqual([0, 3000]);
+  });
+
+  test('fails immediately on a non-retryable 4xx', async () => {
+    respondWith(404);
+
+    const outcome = await settle(server.trelloRequest('/boards/b/lists'));
+
+    expect(outcome.error.message).toBe('Trello API request failed');
+    expect(callTimes).toEqual([Date.parse('2026-01-01T00:00:00.000Z')]);
+  });
+});
+
+describe('trelloRequest circuit breaker', () => {
+  let server;
+  let trelloFetchMock;
+
+  beforeEach(() => {
+    jest.useFakeTimers({ now: Date.parse('2026-01-01T00:00:00.000Z') });
+    ({ server, trelloFetchMock } = loadServer());
+    // No backoff, so the attempts spend retry tokens back to back
+    jest.spyOn(Math, 'random').mockReturnValue(0);
+  });
+
+  afterEach(() => {
+    jest.useRealTimers();
+    jest.restoreAllMocks();
+  });
+
+  function outcomeOf(promise) {
+    return promise.then(value => ({ value: value }), error => ({ error: error }));
+  }
+
+  // Two calls of five failed attempts each spend all ten retry tokens
+  async function openCircuit() {
+    const outcomes = [
+      outcomeOf(server.trelloRequest('/boards/b/lists')),
+      outcomeOf(server.trelloRequest('/boards/b/cards'))
+    ];
+    // Zero-length backoffs still take a 1ms timer tick each
+    await jest.advanceTimersByTimeAsync(100);
+    return Promise.all(outcomes);
+  }
+
+  test('opens once the retry tokens run out and then fails fast', async () => {
+    trelloFetchMock.mockResolvedValue(reply(503));
+    await openCircuit();
+    expect(trelloFetchMock).toHaveBeenCalledTimes(10);
+
+    const outcome = await outcomeOf(server.trelloRequest('/boards/b/lists'));
+
+    expect(outcome.error).toBeInstanceOf(server.TrelloUnavailableError);
+    expect(trelloFetchMock).toHaveBeenCalledTimes(10);
+  });
+
+  test('late failures do not push back the cooldown, which then resets', async () => {
+    trelloFetchMock.mockImplementation(async url => {
+      if (url.includes('/slow')) {
+        await new Promise(resolve => setTimeout(resolve, 10000));
+      }
+      return reply(503);
+    });
+    const start = Date.now();
+
+    // Sent before the circuit opens, fails 10s after it has opened
+    const slow = outcomeOf(server.trelloRequest('/slow'));
+    await openCircuit();
+    const openedBy = Date.now();
+    await jest.advanceTimersByTimeAsync(10000);
+    expect((await slow).error).toBeInstanceOf(server.TrelloUnavailableError);
+
+    jest.setSystemTime(start + server.CIRCUIT_COOLDOWN_MS - 1);
+    const stillOpen = await outcomeOf(server.trelloRequest('/boards/b/lists'));
+    expect(stillOpen.error).toBeInstanceOf(server.TrelloUnavailableError);
+
+    trelloFetchMock.mockResolvedValue(reply(200));
+    const callsBefore = trelloFetchMock.mock.calls.length;
+    // Had the late failure restarted the cooldown, it would run to ~40s
+    jest.setSystemTime(openedBy + server.CIRCUIT_COOLDOWN_MS);
+    const afterCooldown = await outcomeOf(server.trelloRequest('/boards/b/lists'));
+
+    expect(afterCooldown.value.ok).toBe(true);
+    expect(trelloFetchMock).toHaveBeenCalledTimes(callsBefore + 1);
+  });
+
+  test('routes answer an open circuit with a distinct 503 body', async () => {
+    trelloFetchMock.mockResolvedValue(reply(503));
+    await openCircuit();
+
+    const res = { status: jest.fn(() => res), json: jest.fn(() => res) };
+    const listsRoute = server.app._router.stack
+      .find(layer => layer.route && layer.route.path === '/api/lists')
+      .route.stack[0].handle;
+    await listsRoute({ query: { boardId: 'b' } }, res);
+
+    expect(res.status).toHaveBeenCalledWith(503);
+    expect(res.json.mock.calls[0][0].error).toMatch(/try again/);
+  });
+});
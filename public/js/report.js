@@ -22,7 +22,41 @@ function formatDate(date) {
   return date.toISOString().split('T')[0];
 }
 
+// Parse a server response, surfacing the server's error message if any
+async function readServerJson(response) {
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    throw new Error(body.error || 'Failed to fetch data from server');
+  }
+  return response.json();
+}
+
+// List IDs don't change while the modal is open, so the board's lists are
+// fetched once and reused across report generations
+let listIds = null;
+
+async function getListId(boardId, listName) {
+  if (!listIds) {
+    const response = await fetch(`${window.TrelloConfig.apiUrl}/api/lists?boardId=${boardId}`);
+    const lists = await readServerJson(response);
+    // Keep the first list when names collide, as lists.find() would
+    listIds = new Map();
+    lists.forEach(list => {
+      const name = list.name.toLowerCase();
+      if (!listIds.has(name)) {
+        listIds.set(name, list.id);
+      }
+    });
+  }
+  return listIds.get(listName.toLowerCase());
+}
+
 document.getElementById('generate-report').addEventListener('click', async function() {
+  // Ignore further clicks until this report finishes, so repeated clicks
+  // don't queue duplicate Trello fetches behind the one in flight
+  const generateButton = this;
+  generateButton.disabled = true;
+
   try {
     // Show loading state
     const reportContent = document.getElementById('report-content');
@@ -45,62 +79,79 @@ document.getElementById('generate-report').addEventListener('click', async funct
     
     // Fetch data from secure server endpoints
     const API_BASE_URL = window.TrelloConfig.apiUrl;
-    const [listsResponse, cardsResponse] = await Promise.all([
-      fetch(`${API_BASE_URL}/api/lists?boardId=${board.id}`),
-      fetch(`${API_BASE_URL}/api/cards?boardId=${board.id}`)
+    const actionsQuery = `since=${startDate.toISOString()}&before=${endDate.toISOString()}`;
+    const [doneListId, cardsResponse, actionsResponse] = await Promise.all([
+      getListId(board.id, 'done'),
+      fetch(`${API_BASE_URL}/api/cards?boardId=${board.id}`),
+      fetch(`${API_BASE_URL}/api/actions?boardId=${board.id}&${actionsQuery}`)
     ]);
 
-    if (!listsResponse.ok || !cardsResponse.ok) {
-      throw new Error('Failed to fetch data from server');
-    }
-
-    const lists = await listsResponse.json();
-    const cards = await cardsResponse.json();
+    const cards = await readServerJson(cardsResponse);
+    const actions = await readServerJson(actionsResponse);
 
-    const doneList = lists.find(list => list.name.toLowerCase() === 'done');
-    if (!doneList) {
+    if (!doneListId) {
+      // The list may be added or renamed while the modal is open, so look
+      // the lists up again on the next click
+      listIds = null;
       throw new Error('No "Done" list found on this board');
     }
 
-    // Filter completed cards
-    const completedCards = cards.filter(card => {
-      const movedDate = new Date(card.dateLastActivity);
-      return card.idList === doneList.id && 
-             movedDate >= startDate && 
-             movedDate <= endDate;
+    // Bucket the board actions by card, keeping the latest move into Done.
+    // Actions come back newest first, so the first hit per card wins.
+    const doneDates = new Map();
+    actions.forEach(action => {
+      const list = action.data.listAfter || action.data.list;
+      if (list && list.id === doneListId && !doneDates.has(action.data.card.id)) {
+        doneDates.set(action.data.card.id, Date.parse(action.date));
+      }
     });
 
+    // Filter completed cards, oldest completion first. completedAt is parsed
+    // once above and reused for sorting and display.
+    const completedCards = cards
+      .filter(card => card.idList === doneListId && doneDates.has(card.id))
+      .map(card => Object.assign({}, card, { completedAt: doneDates.get(card.id) }))
+      .sort((a, b) => a.completedAt - b.completedAt);
+
     await displayReport(completedCards);
 
   } catch (error) {
     console.error('Error generating report:', error);
     document.getElementById('report-content').innerHTML = 
       `<div class="error">Error: ${error.message}</div>`;
+  } finally {
+    generateButton.disabled = false;
   }
 });
 
-function displayReport(cards) {
-  const reportHtml = `
-    <h3>Completed Tasks (${cards.length})</h3>
-    <table>
+// Static table header, shared by every report
+const REPORT_TABLE_HEAD = `
       <thead>
         <tr>
           <th>Task Name</th>
           <th>Labels</th>
           <th>Completed Date</th>
         </tr>
-      </thead>
-      <tbody>
-        ${cards.map(card => `
+      </thead>`;
+
+// toLocaleDateString() builds a new formatter on every call; reuse one
+const completedDateFormat = new Intl.DateTimeFormat();
+
+function displayReport(cards) {
+  const rows = cards.map(card => `
           <tr>
-            <td>${card.name}</td>
+            <td><a href="${card.url}" target="_blank" rel="noopener">${card.name}</a></td>
             <td>${card.labels.map(label => label.name).join(', ') || 'No Labels'}</td>
-            <td>${new Date(card.dateLastActivity).toLocaleDateString()}</td>
-          </tr>
-        `).join('')}
+            <td>${completedDateFormat.format(card.completedAt)}</td>
+          </tr>`);
+
+  const reportHtml = `
+    <h3>Completed Tasks (${cards.length})</h3>
+    <table>${REPORT_TABLE_HEAD}
+      <tbody>${rows.join('')}
       </tbody>
     </table>
   `;
   
   document.getElementById('report-content').innerHTML = reportHtml;
-} 
\ No newline at end of file
+}
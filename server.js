@@ -2,6 +2,7 @@ const express = require('express');
 const https = require('https');
 const fs = require('fs');
 const path = require('path');
+const { pipeline } = require('stream/promises');
 const fetch = require('node-fetch');
 const helmet = require('helmet');
 const cors = require('cors');
@@ -42,38 +43,397 @@ app.use(cors(corsOptions));
 // Serve static files from the 'public' directory
 app.use(express.static(path.join(__dirname, 'public')));
 
+// Trello reports the quota left in the current window on every response.
+// Requests go straight through until it runs low, then pause until the
+// window resets instead of blocking on a fixed rate.
+const RATE_LIMIT_THRESHOLD = 2;
+const DEFAULT_RATE_LIMIT_INTERVAL_MS = 10000;
+
+const rateLimiter = {
+  remaining: Infinity,
+  resetAt: 0
+};
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// How long to pause before the next call, 0 while quota remains
+function throttleDelay() {
+  if (rateLimiter.remaining > RATE_LIMIT_THRESHOLD) {
+    return 0;
+  }
+  return Math.max(0, rateLimiter.resetAt - Date.now());
+}
+
+function updateRateLimit(response) {
+  const keyRemaining = response.headers.get('x-rate-limit-api-key-remaining');
+  const tokenRemaining = response.headers.get('x-rate-limit-api-token-remaining');
+  if (keyRemaining !== null || tokenRemaining !== null) {
+    const interval = response.headers.get('x-rate-limit-api-key-interval-ms');
+    rateLimiter.remaining = Math.min(
+      keyRemaining === null ? Infinity : Number(keyRemaining),
+      tokenRemaining === null ? Infinity : Number(tokenRemaining)
+    );
+    rateLimiter.resetAt = Date.now() + Number(interval || DEFAULT_RATE_LIMIT_INTERVAL_MS);
+  }
+
+  if (response.status === 429) {
+    const retryAfter = Number(response.headers.get('retry-after'));
+    rateLimiter.remaining = 0;
+    rateLimiter.resetAt = Date.now() +
+      (retryAfter > 0 ? retryAfter * 1000 : DEFAULT_RATE_LIMIT_INTERVAL_MS);
+  }
+}
+
+// In-flight Trello requests are capped, starting at Trello's per-second
+// budget. The cap is halved on a 429 and grows back additively on success.
+const MAX_CONCURRENCY = 10;
+
+const concurrency = {
+  limit: MAX_CONCURRENCY,
+  active: 0,
+  queue: []
+};
+
+// Reuse TLS connections to api.trello.com across requests. The socket
+// count is left uncapped: a slot is released once headers arrive, but the
+// body is still being read or relayed to a possibly slow client, and a cap
+// here would leave calls holding slots queued behind those sockets.
+const trelloAgent = new https.Agent({
+  keepAlive: true,
+  maxFreeSockets: MAX_CONCURRENCY
+});
+
+function hasFreeSlot() {
+  return concurrency.active < Math.floor(concurrency.limit);
+}
+
+async function acquireSlot() {
+  if (hasFreeSlot()) {
+    concurrency.active++;
+    return;
+  }
+  // releaseSlot() hands the slot over before resolving
+  await new Promise(resolve => concurrency.queue.push(resolve));
+}
+
+function releaseSlot() {
+  concurrency.active--;
+  while (concurrency.queue.length > 0 && hasFreeSlot()) {
+    concurrency.active++;
+    concurrency.queue.shift()();
+  }
+}
+
+function adjustConcurrency(status) {
+  if (status === 429) {
+    concurrency.limit = Math.max(1, concurrency.limit / 2);
+  } else if (status < 400) {
+    concurrency.limit = Math.min(MAX_CONCURRENCY, concurrency.limit + 1 / concurrency.limit);
+  }
+}
+
+// Transient failures (429, 5xx, network errors) are retried with
+// exponential backoff and full jitter before giving up. Retrying stops once
+// the next wait would pass the deadline, so a failing call errors out well
+// before Heroku's 30 second router timeout.
+const MAX_ATTEMPTS = 5;
+const BASE_BACKOFF_MS = 1000;
+const RETRY_DEADLINE_MS = 20000;
+
+function isRetryableStatus(status) {
+  return status === 429 || status >= 500;
+}
+
+function backoffDelay(attempt) {
+  return Math.random() * BASE_BACKOFF_MS * 2 ** attempt;
+}
+
+// Circuit breaker: each failed attempt spends a retry token and each
+// success earns back a fraction of one. Once the tokens run out Trello is
+// treated as degraded and calls fail fast until the cooldown has passed.
+const RETRY_BUCKET_CAPACITY = 10;
+const RETRY_SUCCESS_CREDIT = 0.1;
+const CIRCUIT_COOLDOWN_MS = 30000;
+
+const retryBucket = {
+  tokens: RETRY_BUCKET_CAPACITY,
+  openUntil: 0
+};
+
+// Thrown instead of calling Trello while the circuit is open
+class TrelloUnavailableError extends Error {}
+
+function checkCircuit() {
+  if (retryBucket.tokens > 0) {
+    return;
+  }
+  if (Date.now() < retryBucket.openUntil) {
+    throw new TrelloUnavailableError('Trello API unavailable, failing fast');
+  }
+  retryBucket.tokens = RETRY_BUCKET_CAPACITY;
+}
+
+function spendRetryToken() {
+  if (retryBucket.tokens <= 0) {
+    // Already open; late failures from in-flight calls don't extend it
+    return;
+  }
+  retryBucket.tokens -= 1;
+  if (retryBucket.tokens <= 0) {
+    retryBucket.openUntil = Date.now() + CIRCUIT_COOLDOWN_MS;
+  }
+}
+
+function creditRetryBucket() {
+  retryBucket.tokens = Math.min(
+    RETRY_BUCKET_CAPACITY,
+    retryBucket.tokens + RETRY_SUCCESS_CREDIT
+  );
+}
+
+// GET a Trello REST resource and return the successful response
+async function trelloRequest(resource, params = {}) {
+  const query = new URLSearchParams({
+    ...params,
+    key: TRELLO_API_KEY,
+    token: TRELLO_TOKEN
+  });
+  const url = `https://api.trello.com/1${resource}?${query}`;
+  const deadline = Date.now() + RETRY_DEADLINE_MS;
+
+  for (let attempt = 0; attempt < MAX_ATTEMPTS; attempt++) {
+    checkCircuit();
+    const throttleMs = throttleDelay();
+    if (Date.now() + throttleMs > deadline) {
+      break;
+    }
+    if (throttleMs > 0) {
+      await sleep(throttleMs);
+    }
+
+    let response = null;
+    await acquireSlot();
+    try {
+      response = await fetch(url, { agent: trelloAgent });
+    } catch (error) {
+      // Network error, retried below
+    } finally {
+      releaseSlot();
+    }
+
+    let delayMs;
+    if (!response) {
+      spendRetryToken();
+      delayMs = backoffDelay(attempt);
+    } else {
+      updateRateLimit(response);
+      adjustConcurrency(response.status);
+
+      if (response.ok) {
+        creditRetryBucket();
+        return response;
+      }
+      if (!isRetryableStatus(response.status)) {
+        break;
+      }
+      spendRetryToken();
+      // A 429 pauses the limiter for Retry-After, which the next attempt
+      // waits out after checking it against the deadline
+      delayMs = response.status === 429 ? 0 : backoffDelay(attempt);
+    }
+
+    if (attempt === MAX_ATTEMPTS - 1 || Date.now() + delayMs > deadline) {
+      break;
+    }
+    await sleep(delayMs);
+  }
+
+  throw new Error('Trello API request failed');
+}
+
+// GET a Trello REST resource and return the parsed JSON body
+async function trelloFetch(resource, params = {}) {
+  const response = await trelloRequest(resource, params);
+  return response.json();
+}
+
+// Send a route's error response. An open circuit gets its own 503 body so
+// the Power-Up can tell users to retry later rather than show a generic
+// failure.
+function sendTrelloError(res, error, message) {
+  if (error instanceof TrelloUnavailableError) {
+    return res.status(503).json({
+      error: 'Trello is not responding right now, please try again in a minute'
+    });
+  }
+  res.status(500).json({ error: message });
+}
+
+// Stream a Trello response body to the client as-is, skipping the JSON
+// parse and re-serialize round-trip for data the server doesn't inspect
+async function relayTrello(res, resource, params) {
+  const response = await trelloRequest(resource, params);
+  res.type('json');
+  try {
+    await pipeline(response.body, res);
+  } catch (error) {
+    // Headers are already sent, so pipeline() has aborted the response and
+    // there is no error body left to send
+    console.error('Error relaying Trello response:', error);
+  }
+}
+
 // API Routes
 app.get('/api/lists', async (req, res) => {
   const boardId = req.query.boardId;
   try {
-    const response = await fetch(
-      `https://api.trello.com/1/boards/${boardId}/lists?key=${TRELLO_API_KEY}&token=${TRELLO_TOKEN}`
-    );
-    if (!response.ok) {
-      throw new Error('Trello API request failed');
-    }
-    const data = await response.json();
-    res.json(data);
+    await relayTrello(res, `/boards/${boardId}/lists`, { fields: 'name' });
   } catch (error) {
     console.error('Error fetching lists:', error);
-    res.status(500).json({ error: 'Failed to fetch lists from Trello' });
+    sendTrelloError(res, error, 'Failed to fetch lists from Trello');
   }
 });
 
 app.get('/api/cards', async (req, res) => {
   const boardId = req.query.boardId;
   try {
-    const response = await fetch(
-      `https://api.trello.com/1/boards/${boardId}/cards?key=${TRELLO_API_KEY}&token=${TRELLO_TOKEN}`
-    );
-    if (!response.ok) {
-      throw new Error('Trello API request failed');
+    await relayTrello(res, `/boards/${boardId}/cards`, {
+      fields: 'name,url,labels,idList'
+    });
+  } catch (error) {
+    console.error('Error fetching cards:', error);
+    sendTrelloError(res, error, 'Failed to fetch cards from Trello');
+  }
+});
+
+// Trello caps a single actions page at 1000 entries
+const ACTIONS_PAGE_LIMIT = 1000;
+
+// Fetch every action that can put a card in a list (list moves, creation,
+// copies and moves from another board) on the board after `since` (a date
+// or action ID), optionally up to `before`, in one paginated board-level
+// query, following the `before` cursor until Trello returns a short page.
+async function fetchBoardActions(boardId, since, before) {
+  const actions = [];
+  let cursor = before;
+
+  while (true) {
+    const params = {
+      filter: 'updateCard:idList,createCard,copyCard,moveCardToBoard',
+      fields: 'data,date',
+      memberCreator: false,
+      since: since,
+      limit: ACTIONS_PAGE_LIMIT
+    };
+    if (cursor) {
+      params.before = cursor;
+    }
+
+    const page = await trelloFetch(`/boards/${boardId}/actions`, params);
+    actions.push(...page);
+
+    if (page.length < ACTIONS_PAGE_LIMIT) {
+      return actions;
     }
-    const data = await response.json();
+    cursor = page[page.length - 1].id;
+  }
+}
+
+// Recorded actions never change, so each board's history since the
+// earliest requested date is kept in memory (newest first), each action
+// paired with its parsed timestamp. Later reports only ask Trello for
+// actions newer than the newest one already cached.
+const MAX_CACHED_BOARDS = 50;
+const MAX_CACHED_ACTIONS = 5000;
+const actionsCache = new Map();
+
+// Longest range /api/actions serves, which bounds how much history one
+// request can pull from Trello
+const MAX_RANGE_MS = 92 * 24 * 60 * 60 * 1000;
+
+function toCacheEntries(actions) {
+  return actions.map(action => ({ action: action, time: Date.parse(action.date) }));
+}
+
+// Prepend actions newer than the newest one cached, skipping any that a
+// concurrent refresh already added
+function mergeNewerActions(cached, newer) {
+  const newestId = cached.entries.length > 0 ? cached.entries[0].action.id : '';
+  const added = newer.filter(action => action.id > newestId);
+  cached.entries = toCacheEntries(added).concat(cached.entries);
+}
+
+// (Re-)insert a board's entry so the Map's order tracks recent use, and
+// evict the least recently used board when the cache is full. Boards busy
+// enough to exceed MAX_CACHED_ACTIONS are not cached at all.
+function rememberBoardActions(boardId, cached) {
+  actionsCache.delete(boardId);
+  if (cached.entries.length > MAX_CACHED_ACTIONS) {
+    return;
+  }
+  if (actionsCache.size >= MAX_CACHED_BOARDS) {
+    actionsCache.delete(actionsCache.keys().next().value);
+  }
+  actionsCache.set(boardId, cached);
+}
+
+async function getBoardActions(boardId, since, before) {
+  const sinceTime = Date.parse(since);
+  const beforeTime = before ? Date.parse(before) : Infinity;
+
+  // A range that has already ended is fetched with its end bound and not
+  // cached; the cache only holds history running up to the present
+  if (beforeTime <= Date.now()) {
+    return fetchBoardActions(boardId, since, before);
+  }
+
+  let cached = actionsCache.get(boardId);
+
+  if (cached && cached.sinceTime <= sinceTime) {
+    const newestId = cached.entries.length > 0 ? cached.entries[0].action.id : cached.since;
+    const newer = await fetchBoardActions(boardId, newestId);
+    // Another request may have refreshed or replaced the entry while this
+    // one waited; merge into the current one if it still covers `since`
+    const current = actionsCache.get(boardId);
+    if (current && current.sinceTime <= sinceTime) {
+      cached = current;
+    }
+    mergeNewerActions(cached, newer);
+  } else {
+    const actions = await fetchBoardActions(boardId, since);
+    cached = {
+      since: since,
+      sinceTime: sinceTime,
+      entries: toCacheEntries(actions)
+    };
+  }
+  rememberBoardActions(boardId, cached);
+
+  return cached.entries
+    .filter(entry => entry.time >= sinceTime && entry.time < beforeTime)
+    .map(entry => entry.action);
+}
+
+app.get('/api/actions', async (req, res) => {
+  const { boardId, since, before } = req.query;
+  if (isNaN(Date.parse(since))) {
+    return res.status(400).json({ error: 'A valid since date is required' });
+  }
+  if (before !== undefined && isNaN(Date.parse(before))) {
+    return res.status(400).json({ error: 'before must be a valid date' });
+  }
+  const rangeEnd = before === undefined ? Date.now() : Math.min(Date.parse(before), Date.now());
+  if (rangeEnd - Date.parse(since) > MAX_RANGE_MS) {
+    return res.status(400).json({ error: 'The date range may span at most 92 days' });
+  }
+  try {
+    const data = await getBoardActions(boardId, since, before);
     res.json(data);
   } catch (error) {
-    console.error('Error fetching cards:', error);
-    res.status(500).json({ error: 'Failed to fetch cards from Trello' });
+    console.error('Error fetching actions:', error);
+    sendTrelloError(res, error, 'Failed to fetch actions from Trello');
   }
 });
 
@@ -101,8 +461,22 @@ async function setupServer() {
   });
 }
 
-// Start Server
-setupServer().catch(error => {
-  console.error('Failed to start server:', error);
-  process.exit(1);
-});
+// Start Server, unless loaded by the tests
+if (require.main === module) {
+  setupServer().catch(error => {
+    console.error('Failed to start server:', error);
+    process.exit(1);
+  });
+}
+
+module.exports = {
+  app,
+  actionsCache,
+  getBoardActions,
+  trelloRequest,
+  TrelloUnavailableError,
+  CIRCUIT_COOLDOWN_MS,
+  MAX_ATTEMPTS,
+  MAX_CACHED_ACTIONS,
+  RETRY_DEADLINE_MS
+};